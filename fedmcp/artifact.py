@@ -1,5 +1,12 @@
-from jwcrypto import jwk, jws
-import json, datetime
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import (
+    decode_dss_signature,
+    encode_dss_signature,
+)
+import base64, orjson
+from functools import lru_cache
 from typing import TypedDict, Any
 
 class Artifact(TypedDict):
@@ -10,19 +17,69 @@ class Artifact(TypedDict):
     createdAt: str
     jsonBody: Any
 
+_ES256 = ec.ECDSA(hashes.SHA256())
+
+def _b64u(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64u_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+def _check_p256(key):
+    if not (isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey))
+            and isinstance(key.curve, ec.SECP256R1)):
+        raise ValueError("ES256 requires a P-256 key")
+    return key
+
+# PEM parsing (ASN.1 decode + bignum setup) costs far more than the ECDSA op
+# itself, and the protected header only depends on the kid; memoize both.
+@lru_cache(maxsize=32)
+def _load_priv(pem: str, kid: str) -> tuple[ec.EllipticCurvePrivateKey, bytes]:
+    key = _check_p256(serialization.load_pem_private_key(pem.encode(), password=None))
+    header = orjson.dumps({"alg": "ES256", "typ": "JWT", "kid": kid})
+    return key, _b64u(header)
+
+@lru_cache(maxsize=32)
+def _load_pub(pem: str) -> ec.EllipticCurvePublicKey:
+    return _check_p256(serialization.load_pem_public_key(pem.encode()))
+
+@lru_cache(maxsize=32)
+def _check_header(header_b64: bytes) -> None:
+    header = orjson.loads(_b64u_decode(header_b64))
+    if not isinstance(header, dict) or header.get("alg") != "ES256":
+        raise ValueError("unsupported JWS alg")
+
+def sign_bytes(payload: bytes, pem_private: str, kid: str = "workspace-root") -> str:
+    key, header_b64 = _load_priv(pem_private, kid)
+    signing_input = header_b64 + b"." + _b64u(payload)
+    # JWS wants the raw 64-byte r||s form, not the DER that OpenSSL emits.
+    r, s = decode_dss_signature(key.sign(signing_input, _ES256))
+    sig = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+    return (signing_input + b"." + _b64u(sig)).decode()
+
 def sign_artifact(art: Artifact, pem_private: str, kid: str = "workspace-root") -> str:
-    key = jwk.JWK.from_pem(pem_private.encode())
-    key.update(kid=kid, alg="ES256")
-    token = jws.JWS(json.dumps(art).encode())
-    token.add_signature(key, protected={"alg": "ES256", "typ": "JWT", "kid": kid})
-    return token.serialize(compact=True)
+    # orjson, unlike json, rejects integers outside the 64-bit range
+    try:
+        payload = orjson.dumps(art)
+    except orjson.JSONEncodeError as e:
+        raise ValueError(f"artifact is not serializable as JSON: {e}") from None
+    return sign_bytes(payload, pem_private, kid)
 
 def verify_artifact(jws_compact: str, pem_public: str, expected_workspace: str) -> Artifact:
-    key = jwk.JWK.from_pem(pem_public.encode())
-    token = jws.JWS()
-    token.deserialize(jws_compact)
-    token.verify(key)
-    art: Artifact = json.loads(token.payload)
-    if art["workspaceId"] != expected_workspace:
+    key = _load_pub(pem_public)
+    header_b64, payload_b64, sig_b64 = jws_compact.encode().split(b".")
+    sig = _b64u_decode(sig_b64)
+    if len(sig) != 64:
+        raise ValueError("malformed ES256 signature")
+    der = encode_dss_signature(int.from_bytes(sig[:32], "big"), int.from_bytes(sig[32:], "big"))
+    _check_header(header_b64)
+    try:
+        key.verify(der, header_b64 + b"." + payload_b64, _ES256)
+    except InvalidSignature:
+        raise ValueError("invalid signature") from None
+    art: Artifact = orjson.loads(_b64u_decode(payload_b64))
+    if not isinstance(art, dict):
+        raise ValueError("JWS payload is not an artifact")
+    if art.get("workspaceId") != expected_workspace:
         raise ValueError("workspaceId mismatch")
-    return art
\ No newline at end of file
+    return art
@@ -1,17 +1,43 @@
-import json, uuid, datetime
+import msgspec, os, sys, threading, uuid, datetime
 from typing import Literal
 
+_UTC = datetime.timezone.utc
+
 AuditAction = Literal["create", "update", "deploy", "delete"]
 
+class _Event(msgspec.Struct):
+    eventId: uuid.UUID
+    artifactId: str
+    action: AuditAction
+    actor: str
+    timestamp: datetime.datetime
+
+_encoder = msgspec.json.Encoder()
+
+# uuid4() costs one getrandom() syscall per id; draw randomness 4 KiB at a time.
+_RAND_POOL_SIZE = 4096
+_rand_pool = b""
+_rand_pos = 0
+_rand_lock = threading.Lock()
+
+def _reset_rand_pool() -> None:
+    # A forked child must never reuse its parent's unread randomness.
+    global _rand_pool, _rand_pos
+    _rand_pool, _rand_pos = b"", 0
+
+if hasattr(os, "register_at_fork"):  # Unix only; nothing forks on Windows
+    os.register_at_fork(after_in_child=_reset_rand_pool)
+
+def _new_uuid() -> uuid.UUID:
+    global _rand_pool, _rand_pos
+    with _rand_lock:
+        if _rand_pos + 16 > len(_rand_pool):
+            _rand_pool, _rand_pos = os.urandom(_RAND_POOL_SIZE), 0
+        raw = _rand_pool[_rand_pos:_rand_pos + 16]
+        _rand_pos += 16
+    return uuid.UUID(bytes=raw, version=4)  # sets the RFC 4122 version/variant bits
+
 def emit_event(artifact_id: str, action: AuditAction, actor: str) -> None:
-    evt = {
-        "eventId": str(uuid.uuid4()),
-        "artifactId": artifact_id,
-        "action": action,
-        "actor": actor,
-        "timestamp": datetime.datetime.utcnow()
-        .replace(tzinfo=datetime.timezone.utc)
-        .isoformat(),
-    }
-    print(json.dumps(evt))
+    evt = _Event(_new_uuid(), artifact_id, action, actor, datetime.datetime.now(_UTC))
+    sys.stdout.write(_encoder.encode(evt).decode() + "\n")
     # TODO: push to S3/SQS/Postgres later
\ No newline at end of file
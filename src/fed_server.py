@@ -3,13 +3,19 @@
 
 from __future__ import annotations
 
+import asyncio
+import gc
 import hashlib
-import json
+import logging
 import os
-from datetime import datetime
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 import boto3
+import orjson
 from fastapi import FastAPI, Request, Response
 from presidio_analyzer import AnalyzerEngine
 from presidio_analyzer.nlp_engine import SpacyNlpEngine
@@ -19,74 +25,383 @@ from presidio_analyzer.nlp_engine import SpacyNlpEngine
 # --------------------------------------------------------------------------- #
 
 app = FastAPI(title="FedMCP reference server")
+log = logging.getLogger(__name__)
 
 # --------------------------------------------------------------------------- #
 #  Presidio analyzer — cached to avoid model reload on every request
 # --------------------------------------------------------------------------- #
 
 
+# Only NER feeds the PII verdict; skip the pipes that don't contribute to it.
+_UNUSED_PIPES = ("parser", "lemmatizer", "tagger")
+
+
 @lru_cache
 def get_analyzer() -> AnalyzerEngine:
     """Return a cached Presidio AnalyzerEngine with a small English model."""
-    nlp_engine = SpacyNlpEngine()
-    nlp_engine.load({"en": "en_core_web_sm"})
+    nlp_engine = SpacyNlpEngine(
+        models=[{"lang_code": "en", "model_name": "en_core_web_sm"}]
+    )
+    nlp_engine.load()
+    nlp = nlp_engine.nlp["en"]
+    for pipe in _UNUSED_PIPES:
+        if pipe in nlp.pipe_names:
+            nlp.disable_pipe(pipe)
     return AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=["en"])
 
 
+# Load the model at import time so a pre-forking server (gunicorn --preload)
+# pays for it once in the parent and workers share it copy-on-write.
+if os.getenv("PRELOAD_NLP", "1") == "1":
+    get_analyzer()
+    gc.freeze()  # keep the collector from touching (and un-sharing) those pages
+
+
+# Cheap first stage: only bodies that look like they carry SSNs, card numbers,
+# e-mail addresses or phone numbers are worth a full spaCy/Presidio pass.
+_PII_RE = re.compile(
+    rb"\d{3}-\d{2}-\d{4}|\b\d{16}\b|[\w.]+@[\w.]+|\(\d{3}\)\s*\d{3}-\d{4}"
+)
+_SCANNED_CONTENT_TYPES = frozenset({"application/json", "text/plain"})
+_MIN_SCAN_BYTES = 32
+
+
+def _scannable(content_type: str, length: int) -> bool:
+    """O(1) check, done inline: could a body of this type and size hold PII?"""
+    return (
+        length >= _MIN_SCAN_BYTES
+        and content_type.split(";", 1)[0].strip().lower() in _SCANNED_CONTENT_TYPES
+    )
+
+
 # --------------------------------------------------------------------------- #
 #  Optional CloudWatch audit sink
 # --------------------------------------------------------------------------- #
 
 LOG_GROUP = os.getenv("AUDIT_LOG_GROUP")
 LOG_STREAM = os.getenv("AUDIT_LOG_STREAM", "primary")
-_logs = boto3.client("logs") if LOG_GROUP else None
+_logs = None  # boto3 client, created off the event loop at startup
+# Dedicated single thread so a slow put_log_events round-trip neither blocks the
+# event loop nor queues behind Presidio scans, and puts stay ordered per stream.
+_logs_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cloudwatch")
 
 
-def _emit_audit(record: dict) -> None:
-    """Send a single audit record to CloudWatch (if configured)."""
-    if not _logs:
+# put_log_events limits: 1,048,576 bytes per call, where each event counts its
+# UTF-8 message length plus 26 bytes, and 256 KiB per event.
+PUT_MAX_BYTES = 1_048_576
+EVENT_OVERHEAD = 26
+EVENT_MAX_BYTES = 256 * 1024 - EVENT_OVERHEAD
+_MAX_PATH_CHARS = 8192  # oversized events keep this much of the request path
+
+# (epoch ms, JSON message, bytes it counts against PUT_MAX_BYTES)
+LogEvent = tuple[int, str, int]
+
+
+def _encode_audit(ts_ms: int, record: dict) -> LogEvent:
+    """Encode one record as a CloudWatch message that fits a single event."""
+    message = orjson.dumps(record)
+    if len(message) > EVENT_MAX_BYTES:
+        # The client-supplied path is the only unbounded field
+        record = {
+            **record,
+            "path": record["path"][:_MAX_PATH_CHARS],
+            "path_truncated": True,
+        }
+        message = orjson.dumps(record)
+    return ts_ms, message.decode(), len(message) + EVENT_OVERHEAD
+
+
+def _emit_audit(events: list[LogEvent]) -> None:
+    """Send one size-checked batch of events to CloudWatch (if configured)."""
+    if not _logs or not events:
         return
     _logs.put_log_events(
         logGroupName=LOG_GROUP,
         logStreamName=LOG_STREAM,
+        # CloudWatch wants each batch in chronological order
         logEvents=[
-            {
-                "timestamp": int(datetime.utcnow().timestamp() * 1000),
-                "message": json.dumps(record),
-            }
+            {"timestamp": ts_ms, "message": message}
+            for ts_ms, message, _ in sorted(events, key=lambda e: e[0])
         ],
     )
 
 
+def _contains_pii(raw_body: bytes) -> bool:
+    """Run the (prefiltered) Presidio scan; never raises."""
+    if len(raw_body) < _MIN_SCAN_BYTES or _PII_RE.search(raw_body) is None:
+        return False
+    try:
+        return bool(
+            get_analyzer().analyze(raw_body.decode("utf-8", "ignore"), language="en")
+        )
+    except Exception:
+        return False
+
+
+# --------------------------------------------------------------------------- #
+#  Background audit worker – keeps Presidio and CloudWatch off the request path
+# --------------------------------------------------------------------------- #
+
+AUDIT_QUEUE_SIZE = 1024
+AUDIT_BATCH_SIZE = 64
+# Upper bound on request bodies held for scanning; past it, requests are still
+# audited but queued without their body (and so recorded as pii=False).
+AUDIT_QUEUE_MAX_BYTES = 16 << 20
+
+# (request time in epoch ms, path, method, body to scan or b"", digest)
+AuditItem = tuple[int, str, str, bytes, str]
+
+# Created at startup so they bind to the serving event loop.
+_audit_q: asyncio.Queue[AuditItem] | None = None
+_audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit")
+_audit_tasks: set[asyncio.Task] = set()
+audit_dropped = 0  # items discarded because the queue was full
+audit_scan_skipped = 0  # scannable bodies not queued because of the byte cap
+audit_put_failed = 0  # records lost because put_log_events failed
+_audit_q_bytes = 0  # body bytes queued or being scanned
+_audit_inflight: list[AuditItem] = []  # batch the worker is scanning right now
+
+
+def _scan_audit_batch(items: list[AuditItem]) -> list[tuple[int, dict]]:
+    """Turn queued requests into audit records (runs in ``_audit_pool``)."""
+    return [
+        (
+            ts_ms,
+            {
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts_ms / 1000)),
+                "path": path,
+                "method": method,
+                "pii": _contains_pii(raw_body),
+                BODY_HASH: digest,
+            },
+        )
+        for ts_ms, path, method, raw_body, digest in items
+    ]
+
+
+class AuditBatcher:
+    """Buffer audit records and ship them to CloudWatch in few, large calls.
+
+    A flush happens once ``MAX_BATCH`` records are pending or ``MAX_AGE``
+    seconds after the previous flush, whichever comes first. Each
+    ``put_log_events`` call carries at most ``MAX_PUT`` events and
+    ``PUT_MAX_BYTES`` of encoded messages.
+    """
+
+    MAX_BATCH = 100
+    MAX_AGE = 0.25  # seconds
+    MAX_PUT = 1000  # events per put_log_events call
+
+    def __init__(self) -> None:
+        self._buf: deque[LogEvent] = deque()
+        self._last_flush = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+
+    def add(self, record: tuple[int, dict]) -> None:
+        self._buf.append(_encode_audit(*record))
+        if len(self._buf) >= self.MAX_BATCH:
+            self._wake.set()
+
+    def _next_batch(self) -> list[LogEvent]:
+        batch = [self._buf.popleft()]
+        size = batch[0][2]
+        while (
+            self._buf
+            and len(batch) < self.MAX_PUT
+            and size + self._buf[0][2] <= PUT_MAX_BYTES
+        ):
+            size += self._buf[0][2]
+            batch.append(self._buf.popleft())
+        return batch
+
+    async def flush(self) -> None:
+        global audit_put_failed
+        async with self._lock:
+            self._last_flush = time.monotonic()
+            while self._buf:
+                batch = self._next_batch()
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        _logs_pool, _emit_audit, batch
+                    )
+                except Exception:
+                    audit_put_failed += len(batch)
+                    log.exception(
+                        "put_log_events failed; %d audit records lost", len(batch)
+                    )
+
+    async def run(self) -> None:
+        while True:
+            timeout = self.MAX_AGE - (time.monotonic() - self._last_flush)
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # auditing must never take the flusher down
+
+
+_batcher: AuditBatcher | None = None
+
+
+async def _audit_worker() -> None:
+    global _audit_q_bytes, _audit_inflight
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await _audit_q.get()]
+        while len(items) < AUDIT_BATCH_SIZE and not _audit_q.empty():
+            items.append(_audit_q.get_nowait())
+        # Kept until the records reach the batcher, so a shutdown that cancels
+        # us mid-scan can rescan them instead of losing them.
+        _audit_inflight = items
+        try:
+            records = await loop.run_in_executor(_audit_pool, _scan_audit_batch, items)
+        except Exception:
+            records = []  # auditing must never take the worker down
+        finally:
+            _audit_q_bytes -= sum(len(item[3]) for item in items)
+        _audit_inflight = []
+        for record in records:
+            _batcher.add(record)
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _audit_tasks.add(task)
+    task.add_done_callback(_audit_tasks.discard)
+
+
+@app.on_event("startup")
+async def _start_audit_worker() -> None:
+    global _logs, _audit_q, _batcher, _audit_inflight, _audit_q_bytes
+    _audit_q = asyncio.Queue(maxsize=AUDIT_QUEUE_SIZE)
+    _audit_q_bytes = 0
+    _audit_inflight = []
+    _batcher = AuditBatcher()
+    if LOG_GROUP:
+        _logs = await asyncio.get_running_loop().run_in_executor(
+            _logs_pool, boto3.client, "logs"
+        )
+    _spawn(_audit_worker())
+    _spawn(_batcher.run())
+
+
+@app.on_event("shutdown")
+async def _flush_audit() -> None:
+    """Stop the background tasks, then audit everything they left behind."""
+    global _audit_inflight, _audit_q_bytes
+    tasks = list(_audit_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if _batcher is None:
+        return
+    queued = [_audit_q.get_nowait() for _ in range(_audit_q.qsize())]
+    _audit_q_bytes -= sum(len(item[3]) for item in queued)
+    items = _audit_inflight + queued
+    _audit_inflight = []  # or the next lifespan's shutdown would send it again
+    if items:
+        records = await asyncio.get_running_loop().run_in_executor(
+            _audit_pool, _scan_audit_batch, items
+        )
+        for record in records:
+            _batcher.add(record)
+    await _batcher.flush()
+
+
 # --------------------------------------------------------------------------- #
-#  Middleware – hashes body + optional PII scan & audit
+#  Middleware – hashes body, hands PII scan & audit to the background worker
 # --------------------------------------------------------------------------- #
 
 
+# SHA-256 by default; BODY_HASH=blake3 trades it for the SIMD/multithreaded
+# BLAKE3 fingerprint (needs the optional ``blake3`` package).
+BODY_HASH = os.getenv("BODY_HASH", "sha256").lower()
+if BODY_HASH == "blake3":
+    from blake3 import blake3
+
+    DIGEST_HEADER = "X-Content-BLAKE3"
+
+    def _new_hasher(data: bytes = b""):
+        return blake3(data, max_threads=blake3.AUTO)
+
+elif BODY_HASH == "sha256":
+    DIGEST_HEADER = "X-Content-SHA256"
+    _new_hasher = hashlib.sha256
+else:
+    raise ValueError(f"Unsupported BODY_HASH {BODY_HASH!r} (use sha256 or blake3)")
+
+STREAM_HASH_THRESHOLD = 1 << 20  # bodies this large are hashed as they arrive
+
+
+def _hash_chunks(hasher, chunks: list[bytes]) -> None:
+    for chunk in chunks:
+        hasher.update(chunk)
+
+
+async def _read_body(request: Request) -> tuple[bytes, str]:
+    """Return the request body together with its ``BODY_HASH`` hex digest.
+
+    Small bodies with a known length are read in one go. Anything larger, or
+    sent chunked, is hashed while it is received: every ``STREAM_HASH_THRESHOLD``
+    bytes are handed to a worker thread, where the hasher releases the GIL, so
+    concurrent large uploads are hashed in parallel across cores rather than
+    one after another on the event loop.
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) < STREAM_HASH_THRESHOLD:
+        raw_body = await request.body()
+        return raw_body, _new_hasher(raw_body).hexdigest()
+
+    hasher = _new_hasher()
+    chunks: list[bytes] = []
+    hashed = pending = 0  # chunks already hashed / bytes received since then
+    async for chunk in request.stream():
+        chunks.append(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_HASH_THRESHOLD:
+            await asyncio.to_thread(_hash_chunks, hasher, chunks[hashed:])
+            hashed, pending = len(chunks), 0
+    _hash_chunks(hasher, chunks[hashed:])
+    raw_body = b"".join(chunks)
+    # Cache it where Starlette replays it to the endpoint after call_next.
+    request._body = raw_body
+    return raw_body, hasher.hexdigest()
+
+
 @app.middleware("http")
 async def audit_middleware(request: Request, call_next):  # type: ignore[return-value]
-    raw_body = await request.body()
-    sha256 = hashlib.sha256(raw_body).hexdigest()
+    global audit_dropped, audit_scan_skipped, _audit_q_bytes
 
-    try:
-        contains_pii = bool(
-            get_analyzer().analyze(raw_body.decode("utf-8", "ignore"), language="en")
+    raw_body, digest = await _read_body(request)
+
+    if _audit_q is None or _audit_q.full():
+        audit_dropped += 1
+    else:
+        # Only keep the body alive in the queue if the worker could scan it.
+        scan_body = b""
+        if _scannable(request.headers.get("content-type", ""), len(raw_body)):
+            if _audit_q_bytes + len(raw_body) <= AUDIT_QUEUE_MAX_BYTES:
+                scan_body = raw_body
+                _audit_q_bytes += len(raw_body)
+            else:
+                audit_scan_skipped += 1
+        _audit_q.put_nowait(
+            (
+                int(time.time() * 1000),
+                request.url.path,
+                request.method,
+                scan_body,
+                digest,
+            )
         )
-    except Exception:
-        contains_pii = False
-
-    _emit_audit(
-        {
-            "ts": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-            "path": request.url.path,
-            "method": request.method,
-            "pii": contains_pii,
-            "sha256": sha256,
-        }
-    )
 
     response: Response = await call_next(request)
-    response.headers["X-Content-SHA256"] = sha256
+    response.headers[DIGEST_HEADER] = digest
     return response
 
 
@@ -5,18 +5,19 @@ Provides artifact storage, signing, verification, and audit capabilities
 """
 
 import os
-import json
-import hashlib
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List
+import gzip
+from collections import defaultdict, deque
+from itertools import islice
+from typing import Dict, Any, Optional, List, Tuple
 from uuid import UUID
 import asyncio
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict
 import boto3
+import orjson
 
 # Import our FedMCP core library
 import sys
@@ -44,6 +45,10 @@ KMS_KEY_ID = os.getenv("KMS_KEY_ID")
 # Audit configuration
 AUDIT_LOG_GROUP = os.getenv("AUDIT_LOG_GROUP")
 AUDIT_LOG_STREAM = os.getenv("AUDIT_LOG_STREAM", "primary")
+AUDIT_MAX = int(os.getenv("AUDIT_MAX", "100000"))  # in-memory events retained
+if AUDIT_MAX < 1:
+    # A zero-length deque discards every append while the indexes would keep growing
+    raise ValueError("AUDIT_MAX must be at least 1")
 
 # --------------------------------------------------------------------------- #
 #  FastAPI app
@@ -62,7 +67,10 @@ security = HTTPBearer()
 # --------------------------------------------------------------------------- #
 
 class CreateArtifactRequest(BaseModel):
-    artifact: Dict[str, Any]
+    # Typed as the real model so FastAPI validates the payload exactly once
+    model_config = ConfigDict(extra="forbid")
+    
+    artifact: Artifact
     sign: bool = True
 
 class JWSResponse(BaseModel):
@@ -82,10 +90,29 @@ class VerifyResponse(BaseModel):
 #  Storage backend
 # --------------------------------------------------------------------------- #
 
+def _workspace_key(workspace_id: str) -> str:
+    """Canonical UUID form of a workspace id; raises ValueError otherwise
+
+    Backends key workspaces by this, so ".." or a path can never name one and
+    the same workspace is found whatever case it was written in.
+    """
+    return str(UUID(workspace_id))
+
+
+def _stored_workspace(body: bytes) -> str:
+    """Workspace key of a stored ``{"artifact": ...}`` record; raises ValueError"""
+    record = orjson.loads(body)
+    artifact = record.get("artifact") if isinstance(record, dict) else None
+    workspace_id = artifact.get("workspaceId") if isinstance(artifact, dict) else None
+    if not isinstance(workspace_id, str):
+        raise ValueError("stored record has no workspaceId")
+    return _workspace_key(workspace_id)
+
+
 class StorageBackend:
     """Abstract storage backend"""
     
-    async def store_artifact(self, artifact_id: str, data: Dict[str, Any]) -> None:
+    async def store_artifact(self, artifact_id: str, workspace_id: str, body: bytes) -> None:
         raise NotImplementedError
         
     async def get_artifact(self, artifact_id: str) -> Optional[Dict[str, Any]]:
@@ -93,76 +120,186 @@ class StorageBackend:
         
     async def list_artifacts(self, workspace_id: Optional[str] = None) -> List[str]:
         raise NotImplementedError
+        
+    async def reindex_workspaces(self) -> Tuple[int, int]:
+        raise NotImplementedError
 
 
 class LocalStorage(StorageBackend):
-    """Local filesystem storage"""
+    """Local filesystem storage
+
+    Artifacts live at ``<path>/<id>.json``; an empty marker file at
+    ``<path>/workspaces/<workspaceId>/<id>`` lets listing by workspace skip
+    opening every artifact. Markers only exist for artifacts written since
+    they were introduced; run ``reindex_workspaces`` once to backfill.
+    """
     
     def __init__(self, path: str):
         self.path = Path(path)
         self.path.mkdir(parents=True, exist_ok=True)
+        self.index = self.path / "workspaces"
         
-    async def store_artifact(self, artifact_id: str, data: Dict[str, Any]) -> None:
-        file_path = self.path / f"{artifact_id}.json"
-        with open(file_path, 'w') as f:
-            json.dump(data, f)
+    # Blocking filesystem work runs via asyncio.to_thread so slow disks (or
+    # NFS) don't stall the event loop.
+    
+    def _mark(self, workspace_id: str, artifact_id: str) -> None:
+        workspace_dir = self.index / workspace_id
+        workspace_dir.mkdir(parents=True, exist_ok=True)
+        (workspace_dir / artifact_id).touch()
+        
+    def _write(self, workspace_id: str, artifact_id: str, body: bytes) -> None:
+        with open(self.path / f"{artifact_id}.json", 'wb') as f:
+            f.write(body)
+        # Marker last, so a failed write never lists a missing artifact
+        self._mark(workspace_id, artifact_id)
             
-    async def get_artifact(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+    def _read(self, artifact_id: str) -> Optional[bytes]:
         file_path = self.path / f"{artifact_id}.json"
-        if not file_path.exists():
+        if not file_path.is_file():
             return None
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            return f.read()
             
-    async def list_artifacts(self, workspace_id: Optional[str] = None) -> List[str]:
-        artifacts = []
+    def _list(self, base: Path, pattern: str) -> List[str]:
+        return [p.stem for p in base.glob(pattern)]
+        
+    def _reindex(self) -> Tuple[int, int]:
+        indexed = skipped = 0
         for file_path in self.path.glob("*.json"):
-            if workspace_id:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                    if data.get("artifact", {}).get("workspaceId") == workspace_id:
-                        artifacts.append(file_path.stem)
-            else:
-                artifacts.append(file_path.stem)
-        return artifacts
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            # One bad record must not leave every later artifact unindexed
+            try:
+                workspace_id = _stored_workspace(body)
+            except ValueError:
+                skipped += 1
+                continue
+            self._mark(workspace_id, file_path.stem)
+            indexed += 1
+        return indexed, skipped
+        
+    async def store_artifact(self, artifact_id: str, workspace_id: str, body: bytes) -> None:
+        await asyncio.to_thread(self._write, _workspace_key(workspace_id), artifact_id, body)
+            
+    async def get_artifact(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        body = await asyncio.to_thread(self._read, artifact_id)
+        return orjson.loads(body) if body is not None else None
+            
+    async def list_artifacts(self, workspace_id: Optional[str] = None) -> List[str]:
+        # Filtering by workspace reads the marker directory, never the artifacts
+        if workspace_id:
+            try:
+                workspace_id = _workspace_key(workspace_id)
+            except ValueError:
+                return []
+            return await asyncio.to_thread(self._list, self.index / workspace_id, "*")
+        return await asyncio.to_thread(self._list, self.path, "*.json")
+        
+    async def reindex_workspaces(self) -> Tuple[int, int]:
+        """Write workspace markers for every stored artifact
+
+        Returns ``(indexed, skipped)``; records without a valid UUID
+        workspaceId, or that don't parse, are skipped.
+        """
+        return await asyncio.to_thread(self._reindex)
 
 
 class S3Storage(StorageBackend):
-    """AWS S3 storage"""
+    """AWS S3 storage
+    
+    Artifacts live at ``artifacts/<id>.json``; an empty marker object at
+    ``workspaces/<workspaceId>/<id>`` lets S3 filter by workspace via Prefix
+    while fetching by id stays a single GET. Markers only exist for artifacts
+    written since they were introduced; run ``reindex_workspaces`` once to
+    backfill.
+    """
     
     def __init__(self, bucket: str):
         self.bucket = bucket
         self.s3 = boto3.client('s3')
         
-    async def store_artifact(self, artifact_id: str, data: Dict[str, Any]) -> None:
-        self.s3.put_object(
-            Bucket=self.bucket,
-            Key=f"artifacts/{artifact_id}.json",
-            Body=json.dumps(data),
-            ContentType='application/json'
-        )
+    # boto3 is synchronous, so every call runs via asyncio.to_thread
+    
+    def _list_keys(self, prefix: str) -> List[str]:
+        paginator = self.s3.get_paginator('list_objects_v2')
+        return [
+            obj['Key']
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+            for obj in page.get('Contents', [])
+        ]
         
-    async def get_artifact(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+    def _read(self, artifact_id: str) -> Optional[bytes]:
         try:
             response = self.s3.get_object(
                 Bucket=self.bucket,
                 Key=f"artifacts/{artifact_id}.json"
             )
-            return json.loads(response['Body'].read())
         except self.s3.exceptions.NoSuchKey:
             return None
-            
-    async def list_artifacts(self, workspace_id: Optional[str] = None) -> List[str]:
-        # For workspace filtering, would need to store metadata or scan objects
-        response = self.s3.list_objects_v2(
+        body = response['Body'].read()
+        # Objects written before compression was enabled are plain JSON
+        if response.get('ContentEncoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body
+        
+    def _mark(self, workspace_id: str, artifact_id: str) -> None:
+        self.s3.put_object(
             Bucket=self.bucket,
-            Prefix="artifacts/"
+            Key=f"workspaces/{workspace_id}/{artifact_id}",
+            Body=b""
         )
-        artifacts = []
-        for obj in response.get('Contents', []):
-            artifact_id = obj['Key'].split('/')[-1].replace('.json', '')
-            artifacts.append(artifact_id)
-        return artifacts
+        
+    def _reindex(self) -> Tuple[int, int]:
+        indexed = skipped = 0
+        for key in self._list_keys("artifacts/"):
+            artifact_id = key.rsplit('/', 1)[-1].removesuffix('.json')
+            # One bad record must not leave every later artifact unindexed
+            try:
+                workspace_id = _stored_workspace(self._read(artifact_id) or b"")
+            except (ValueError, EOFError, gzip.BadGzipFile):
+                skipped += 1
+                continue
+            self._mark(workspace_id, artifact_id)
+            indexed += 1
+        return indexed, skipped
+        
+    async def store_artifact(self, artifact_id: str, workspace_id: str, body: bytes) -> None:
+        workspace_id = _workspace_key(workspace_id)
+        await asyncio.to_thread(
+            self.s3.put_object,
+            Bucket=self.bucket,
+            Key=f"artifacts/{artifact_id}.json",
+            # Level 1 is cheap and still shrinks JSON several-fold
+            Body=gzip.compress(body, compresslevel=1),
+            ContentType='application/json',
+            ContentEncoding='gzip'
+        )
+        # Marker last, so a failed PUT never lists a missing artifact
+        await asyncio.to_thread(self._mark, workspace_id, artifact_id)
+        
+    async def get_artifact(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        body = await asyncio.to_thread(self._read, artifact_id)
+        return orjson.loads(body) if body is not None else None
+            
+    async def list_artifacts(self, workspace_id: Optional[str] = None) -> List[str]:
+        # Paginate: a single list_objects_v2 call stops at 1000 keys
+        if workspace_id:
+            try:
+                workspace_id = _workspace_key(workspace_id)
+            except ValueError:
+                return []
+            keys = await asyncio.to_thread(self._list_keys, f"workspaces/{workspace_id}/")
+            return [key.rsplit('/', 1)[-1] for key in keys]
+        keys = await asyncio.to_thread(self._list_keys, "artifacts/")
+        return [key.rsplit('/', 1)[-1].removesuffix('.json') for key in keys]
+        
+    async def reindex_workspaces(self) -> Tuple[int, int]:
+        """Write workspace markers for every stored artifact
+
+        Returns ``(indexed, skipped)``; records without a valid UUID
+        workspaceId, or that don't parse, are skipped.
+        """
+        return await asyncio.to_thread(self._reindex)
 
 # --------------------------------------------------------------------------- #
 #  Initialize components
@@ -187,7 +324,12 @@ verifier = Verifier()
 verifier.add_public_key(signer.get_key_id(), signer.private_key.public_key())
 
 # Audit logger
-audit_logs = []  # In-memory for demo, use CloudWatch in production
+# In-memory ring buffer for demo, use CloudWatch in production. The per-artifact
+# and per-workspace indexes hold the same event dicts in the same order, so the
+# oldest entry of each index is always the next one the ring buffer evicts.
+audit_logs: deque = deque(maxlen=AUDIT_MAX)
+_audit_by_artifact: Dict[str, deque] = defaultdict(deque)
+_audit_by_workspace: Dict[str, deque] = defaultdict(deque)
 
 # --------------------------------------------------------------------------- #
 #  Helper functions
@@ -197,6 +339,27 @@ def get_current_user(auth: HTTPAuthorizationCredentials = Depends(security)) ->
     """Extract user from auth token (simplified for demo)"""
     return f"user:{auth.credentials[:8]}"
 
+def _audit_index_entries(event: Dict[str, Any]):
+    for index, key in (
+        (_audit_by_artifact, event.get("artifactId")),
+        (_audit_by_workspace, event.get("workspaceId")),
+    ):
+        if key is not None:
+            yield index, str(key)
+
+
+def _record_audit_event(event: Dict[str, Any]) -> None:
+    """Append to the ring buffer, dropping the oldest event once full"""
+    if len(audit_logs) == audit_logs.maxlen:
+        evicted = audit_logs[0]
+        for index, key in _audit_index_entries(evicted):
+            index[key].popleft()
+            if not index[key]:
+                del index[key]
+    audit_logs.append(event)
+    for index, key in _audit_index_entries(event):
+        index[key].append(event)
+
 async def log_audit_event(
     action: AuditAction,
     actor: str,
@@ -213,7 +376,7 @@ async def log_audit_event(
         metadata=metadata or {}
     )
     
-    audit_logs.append(event.model_dump(by_alias=True))
+    _record_audit_event(event.model_dump(by_alias=True))
     
     # Optionally send to CloudWatch
     if AUDIT_LOG_GROUP:
@@ -237,31 +400,21 @@ async def create_artifact(
 ):
     """Create and optionally sign a new artifact"""
     try:
-        # Create artifact from request
-        artifact = Artifact(**request.artifact)
+        # Already validated by FastAPI when parsing CreateArtifactRequest
+        artifact = request.artifact
         
-        # Validate
-        artifact.validate()
+        # Serialize once and splice the bytes into the stored record
+        artifact_json = artifact.model_dump_json(by_alias=True).encode()
         
         # Sign if requested
         if request.sign:
             jws_token = signer.sign(artifact)
-            
-            # Store the signed artifact
-            await storage.store_artifact(
-                str(artifact.id),
-                {
-                    "artifact": artifact.model_dump(by_alias=True),
-                    "jws": jws_token
-                }
-            )
+            body = b'{"artifact":' + artifact_json + b',"jws":' + orjson.dumps(jws_token) + b'}'
         else:
-            # Store unsigned artifact
-            await storage.store_artifact(
-                str(artifact.id),
-                {"artifact": artifact.model_dump(by_alias=True)}
-            )
             jws_token = None
+            body = b'{"artifact":' + artifact_json + b'}'
+        
+        await storage.store_artifact(str(artifact.id), str(artifact.workspaceId), body)
         
         # Audit
         await log_audit_event(
@@ -354,13 +507,20 @@ async def get_audit_events(
     limit: int = 100
 ):
     """Query audit events"""
-    events = audit_logs[-limit:]
-    
-    # Filter if requested
+    # Start from the narrowest index, then walk newest-first until `limit` hits
     if artifact_id:
-        events = [e for e in events if e.get("artifactId") == artifact_id]
-    if workspace_id:
-        events = [e for e in events if e.get("workspaceId") == workspace_id]
+        candidates = _audit_by_artifact.get(artifact_id, ())
+    elif workspace_id:
+        candidates = _audit_by_workspace.get(workspace_id, ())
+    else:
+        candidates = audit_logs
+    
+    matches = (
+        e for e in reversed(candidates)
+        if not workspace_id or str(e.get("workspaceId")) == workspace_id
+    )
+    events = list(islice(matches, max(limit, 0)))
+    events.reverse()
     
     return {"events": events}
 
@@ -378,5 +538,10 @@ async def get_jwks():
 # --------------------------------------------------------------------------- #
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if "--reindex" in sys.argv:
+        # One-off backfill of workspace markers for artifacts stored before them
+        indexed, skipped = asyncio.run(storage.reindex_workspaces())
+        print(f"Indexed {indexed} artifacts; skipped {skipped} without a valid workspaceId")
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
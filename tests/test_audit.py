@@ -0,0 +1,34 @@
+from fedmcp import audit
+import pytest
+import json, os, uuid
+
+def test_uuid_version_and_variant():
+    u = audit._new_uuid()
+    assert u.version == 4
+    assert u.variant == uuid.RFC_4122
+
+def test_uuids_unique_across_pool_refill():
+    # 4096-byte pool / 16 bytes per id = 256 ids before the first refill
+    ids = {audit._new_uuid() for _ in range(1000)}
+    assert len(ids) == 1000
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_fork_resets_pool():
+    audit._new_uuid()
+    assert audit._rand_pool
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if audit._rand_pool == b"" and audit._rand_pos == 0 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+def test_emit_event_writes_one_json_line(capsys):
+    audit.emit_event("artifact-1", "create", "alice")
+    out = capsys.readouterr().out
+    assert out.endswith("\n") and out.count("\n") == 1
+    evt = json.loads(out)
+    assert evt["artifactId"] == "artifact-1"
+    assert evt["action"] == "create"
+    assert evt["actor"] == "alice"
+    assert uuid.UUID(evt["eventId"]).version == 4
+    assert evt["timestamp"].endswith("Z")
@@ -1,4 +1,5 @@
-from fedmcp.artifact import sign_artifact, verify_artifact
+from fedmcp.artifact import sign_artifact, sign_bytes, verify_artifact
+import pytest
 import json, pathlib
 
 priv = pathlib.Path("tests/priv.pem").read_text()
@@ -8,4 +9,23 @@ art = json.loads(pathlib.Path("tests/example.json").read_text())
 def test_roundtrip():
     jws = sign_artifact(art, priv, "kid-1")
     verified = verify_artifact(jws, pub, "workspace-1")
-    assert verified["id"] == art["id"]
\ No newline at end of file
+    assert verified["id"] == art["id"]
+
+def test_tampered_payload_rejected():
+    header, _, sig = sign_artifact(art, priv, "kid-1").split(".")
+    forged = sign_artifact({**art, "version": 2}, priv, "kid-1").split(".")[1]
+    with pytest.raises(ValueError):
+        verify_artifact(f"{header}.{forged}.{sig}", pub, "workspace-1")
+
+def test_non_object_header_rejected():
+    _, payload, sig = sign_artifact(art, priv, "kid-1").split(".")
+    with pytest.raises(ValueError):
+        verify_artifact(f"W10.{payload}.{sig}", pub, "workspace-1")  # W10 = "[]"
+
+def test_non_object_payload_rejected():
+    with pytest.raises(ValueError):
+        verify_artifact(sign_bytes(b"[]", priv, "kid-1"), pub, "workspace-1")
+
+def test_oversized_int_rejected():
+    with pytest.raises(ValueError):
+        sign_artifact({**art, "version": 2**64}, priv, "kid-1")